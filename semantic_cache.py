@@ -0,0 +1,75 @@
+import time
+import threading
+import numpy as np
+
+
+class SemanticCache:
+    """
+    In-process cache of responses keyed by query embedding.
+
+    A lookup compares the (L2-normalized) query vector against every cached
+    query vector with a single matrix-vector product and returns the stored
+    response when the best cosine similarity clears the threshold, so
+    near-duplicate queries ("java developer 40 min" / "java dev 40min") skip
+    the vector search entirely. Entries expire after `ttl_seconds`, and once
+    `max_entries` is reached the least recently used entry is replaced.
+    """
+
+    def __init__(self, max_entries: int = 1024, threshold: float = 0.95, ttl_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._vectors = None  # (max_entries, dim) float32, allocated on first store
+        self._responses = [None] * max_entries
+        self._created_at = np.zeros(max_entries)
+        self._last_used = np.zeros(max_entries)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, vector):
+        """Return the cached response for the most similar live query, or None"""
+        query = self._normalize(vector)
+        now = time.monotonic()
+
+        with self._lock:
+            if self._size == 0:
+                return None
+
+            sims = self._vectors[:self._size] @ query
+            sims[now - self._created_at[:self._size] > self.ttl_seconds] = -np.inf
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                return None
+
+            self._last_used[best] = now
+            return self._responses[best]
+
+    def put(self, vector, response) -> None:
+        """Cache a response under its query vector, evicting the LRU entry when full"""
+        query = self._normalize(vector)
+        now = time.monotonic()
+
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, query.shape[0]), dtype=np.float32)
+
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+
+            self._vectors[slot] = query
+            self._responses[slot] = response
+            self._created_at[slot] = now
+            self._last_used[slot] = now
@@ -0,0 +1,106 @@
+import os
+import threading
+from functools import lru_cache
+import httpx
+import openai
+from diskcache import Cache
+from chromadb.config import Settings
+
+# --- LangChain Imports ---
+from langchain_community.vectorstores import Chroma
+from langchain_community.embeddings import OpenAIEmbeddings
+
+# Shared, lazily created handles for every app variant served from this
+# process: each getter builds its object once, so the embedding client,
+# connection pools, Chroma handle (and its HNSW index) and embedding cache
+# exist a single time no matter how many apps import them.
+
+DB_PERSIST_DIRECTORY = "chroma_db_shl"
+EMBED_CACHE_DIRECTORY = "embed_cache"
+EMBED_CACHE_SIZE_LIMIT = 512 << 20  # ~85k cached query vectors
+OPENROUTER_API_BASE = "https://openrouter.ai/api/v1"
+EMBEDDING_MODEL = "openai/text-embedding-ada-002"
+
+# Keep-alive pool shared by every OpenRouter embedding call, so requests reuse
+# warm TCP+TLS connections instead of paying a fresh handshake
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=30.0)
+HTTP_TIMEOUT = 30.0
+
+
+@lru_cache(maxsize=None)
+def get_http_client() -> httpx.Client:
+    return httpx.Client(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT, http2=True)
+
+@lru_cache(maxsize=None)
+def get_async_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT, http2=True)
+
+@lru_cache(maxsize=None)
+def get_embedding() -> OpenAIEmbeddings:
+    """OpenRouter ada-002 embeddings on the shared connection pools"""
+    if "OPENROUTER_API_KEY" not in os.environ:
+        print("Error: OPENROUTER_API_KEY not found in environment variables.")
+        print("Make sure you have a .env file with OPENROUTER_API_KEY set.")
+        raise RuntimeError("OPENROUTER_API_KEY is not set")
+
+    openrouter_args = {
+        "api_key": os.environ["OPENROUTER_API_KEY"],
+        "base_url": OPENROUTER_API_BASE,
+    }
+    # OpenAIEmbeddings only takes a sync http_client (and hands it to its
+    # AsyncOpenAI too, which rejects it), so build both SDK clients here
+    return OpenAIEmbeddings(
+        model=EMBEDDING_MODEL,
+        openai_api_base=openrouter_args["base_url"],
+        openai_api_key=openrouter_args["api_key"],
+        client=openai.OpenAI(http_client=get_http_client(), **openrouter_args).embeddings,
+        async_client=openai.AsyncOpenAI(http_client=get_async_http_client(), **openrouter_args).embeddings
+    )
+
+@lru_cache(maxsize=None)
+def get_vectordb() -> Chroma:
+    return Chroma(
+        persist_directory=DB_PERSIST_DIRECTORY,
+        embedding_function=get_embedding(),
+        # No telemetry events on the query path
+        client_settings=Settings(is_persistent=True, anonymized_telemetry=False)
+    )
+
+@lru_cache(maxsize=None)
+def get_embed_cache() -> Cache:
+    """On-disk query embedding cache (float32 vectors keyed by query hash), LRU-bounded"""
+    return Cache(
+        EMBED_CACHE_DIRECTORY,
+        size_limit=EMBED_CACHE_SIZE_LIMIT,
+        eviction_policy="least-recently-used"
+    )
+
+# Apps currently running on the shared handles; each lifespan acquires on
+# startup and releases on shutdown, and only the last one out closes them,
+# so stopping one app never pulls the pools out from under another
+_owners = 0
+_owners_lock = threading.Lock()
+
+def acquire_shared_clients() -> None:
+    """Register a running app as a user of the shared handles"""
+    global _owners
+    with _owners_lock:
+        _owners += 1
+
+async def release_shared_clients() -> None:
+    """Unregister an app; when none are left, close the pools and cache so the next getter call opens fresh ones"""
+    global _owners
+    with _owners_lock:
+        _owners = max(_owners - 1, 0)
+        if _owners:
+            return
+
+    if get_embed_cache.cache_info().currsize:
+        get_embed_cache().close()
+    if get_http_client.cache_info().currsize:
+        get_http_client().close()
+    if get_async_http_client.cache_info().currsize:
+        await get_async_http_client().aclose()
+
+    for getter in (get_embed_cache, get_vectordb, get_embedding, get_http_client, get_async_http_client):
+        getter.cache_clear()
@@ -0,0 +1,150 @@
+import hashlib
+import importlib
+import os
+import uuid
+from collections import OrderedDict
+
+import chromadb
+import numpy as np
+import pytest
+from diskcache import Cache
+from fastapi.testclient import TestClient
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+N_DOCS = 15
+DIM = 8
+
+
+class FakeEmbedding:
+    """OpenAIEmbeddings stand-in: deterministic vectors per text, counting calls"""
+
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).normal(size=DIM).tolist()
+
+    def _record(self, texts):
+        self.calls.append(list(texts))
+        if self.fail:
+            raise RuntimeError("embedding service unavailable")
+
+    def embed_query(self, text):
+        self._record([text])
+        return self._vector(text)
+
+    async def aembed_query(self, text):
+        self._record([text])
+        return self._vector(text)
+
+    def embed_documents(self, texts):
+        self._record(texts)
+        return [self._vector(text) for text in texts]
+
+
+class FakeVectorDB:
+    """Exposes `_collection` like the LangChain Chroma wrapper"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    # main mounts ./static at import and resolves its stores relative to the cwd
+    monkeypatch.chdir(REPO_ROOT)
+    main = importlib.import_module("main")
+
+    rng = np.random.default_rng(0)
+    collection = chromadb.EphemeralClient().create_collection(f"test-{uuid.uuid4().hex}", embedding_function=None)
+    collection.add(
+        ids=[f"doc-{i}" for i in range(N_DOCS)],
+        embeddings=rng.normal(size=(N_DOCS, DIM)).tolist(),
+        metadatas=[
+            {"name": f"Assessment {i}", "url": f"https://example.com/{i}", "test_type": "Knowledge & Skills", "duration": i}
+            for i in range(N_DOCS)
+        ]
+    )
+    embedding = FakeEmbedding()
+    embed_cache = Cache(str(tmp_path / "embed_cache"))
+
+    monkeypatch.setattr(main, "WARMUP", False)
+    monkeypatch.setattr(main, "get_embedding", lambda: embedding)
+    monkeypatch.setattr(main, "get_vectordb", lambda: FakeVectorDB(collection))
+    monkeypatch.setattr(main, "get_embed_cache", lambda: embed_cache)
+    monkeypatch.setattr(main, "_query_vectors", OrderedDict())
+
+    with TestClient(main.app) as client:
+        yield client, embedding
+    embed_cache.close()
+
+
+def test_batch_keeps_query_order_and_embeds_duplicates_once(api):
+    client, embedding = api
+    queries = ["java developer", "sales graduate", "java developer"]
+
+    responses = client.post("/recommend_batch", json={"queries": queries}).json()
+
+    assert embedding.calls == [["java developer", "sales graduate"]]
+    assert len(responses) == 3
+    assert responses[0] == responses[2]
+    assert responses[0] != responses[1]
+    for query, response in zip(queries, responses):
+        assert len(response["recommended_assessments"]) == 10
+        assert client.post("/recommend", json={"query": query}).json() == response
+
+
+def test_batch_with_no_queries(api):
+    client, embedding = api
+    assert client.post("/recommend_batch", json={"queries": []}).json() == []
+    assert embedding.calls == []
+
+
+def test_batch_error_returns_one_empty_response_per_query(api):
+    client, embedding = api
+    embedding.fail = True
+
+    responses = client.post("/recommend_batch", json={"queries": ["a", "b", "a"]}).json()
+
+    assert responses == [{"recommended_assessments": []}] * 3
+
+
+def test_repeated_batch_is_served_from_cache(api):
+    client, embedding = api
+    body = {"queries": ["java developer", "sales graduate"]}
+
+    first = client.post("/recommend_batch", json=body).json()
+    calls = len(embedding.calls)
+    second = client.post("/recommend_batch", json=body).json()
+
+    assert second == first
+    assert len(embedding.calls) == calls
+
+
+def test_cached_vectors_match_across_memory_and_disk(api):
+    import main
+
+    client, embedding = api
+    first = client.post("/recommend-simple", json={"query": "java developer"}).json()
+    main._query_vectors.clear()  # as in another worker: only the disk copy remains
+    second = client.post("/recommend-simple", json={"query": "java developer"}).json()
+
+    assert second == first
+    assert len(embedding.calls) == 1
+
+
+def test_batch_size_is_capped(api):
+    import main
+
+    client, embedding = api
+    response = client.post("/recommend_batch", json={"queries": ["q"] * (main.MAX_BATCH_QUERIES + 1)})
+
+    assert response.status_code == 422
+    assert embedding.calls == []
+
+
+def test_health_counts_the_served_collection(api):
+    client, _ = api
+    assert client.get("/health").json() == {"status": "healthy", "database_products": N_DOCS}
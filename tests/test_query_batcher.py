@@ -0,0 +1,111 @@
+import asyncio
+import threading
+
+from vector_index import QueryBatcher
+
+
+class RecordingIndex:
+    """Collection.query stand-in whose results identify the vector they belong to"""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def query(self, query_embeddings, n_results, include):
+        self.batch_sizes.append(len(query_embeddings))
+        return {
+            "metadatas": [[{"query": vector[0]}] * n_results for vector in query_embeddings],
+            "distances": [[float(vector[0])] * n_results for vector in query_embeddings]
+        }
+
+
+class FailingIndex:
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    def query(self, query_embeddings, n_results, include):
+        self.calls += 1
+        if self.calls == 1:
+            raise self.error
+        return RecordingIndex().query(query_embeddings, n_results, include)
+
+
+def run_with_batcher(batcher, coroutine_factory):
+    async def main():
+        batcher.start()
+        try:
+            return await coroutine_factory()
+        finally:
+            await batcher.stop()
+    return asyncio.run(main())
+
+
+def test_each_request_gets_its_own_slice():
+    index = RecordingIndex()
+    batcher = QueryBatcher(index, n_results=3, window_seconds=0.05)
+
+    results = run_with_batcher(batcher, lambda: asyncio.gather(*[batcher.query([i]) for i in range(10)]))
+
+    assert index.batch_sizes == [10]
+    for i, result in enumerate(results):
+        assert result == {"metadatas": [{"query": i}] * 3, "distances": [float(i)] * 3}
+
+
+def test_max_batch_size_splits_batches():
+    index = RecordingIndex()
+    batcher = QueryBatcher(index, n_results=1, max_batch_size=4, window_seconds=0.05)
+
+    results = run_with_batcher(batcher, lambda: asyncio.gather(*[batcher.query([i]) for i in range(10)]))
+
+    assert index.batch_sizes == [4, 4, 2]
+    assert [result["distances"][0] for result in results] == [float(i) for i in range(10)]
+
+
+def test_errors_fail_the_batch_and_keep_serving():
+    batcher = QueryBatcher(FailingIndex(RuntimeError("boom")), n_results=1, window_seconds=0.05)
+
+    async def scenario():
+        failed = await asyncio.gather(*[batcher.query([i]) for i in range(3)], return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in failed)
+        return await asyncio.wait_for(batcher.query([7]), timeout=1)
+
+    assert run_with_batcher(batcher, scenario)["distances"] == [7.0]
+
+
+def test_malformed_results_fail_futures_instead_of_hanging():
+    class ShortIndex(RecordingIndex):
+        def query(self, query_embeddings, n_results, include):
+            return super().query(query_embeddings[:1], n_results, include)
+
+    batcher = QueryBatcher(ShortIndex(), n_results=1, window_seconds=0.05)
+
+    async def scenario():
+        return await asyncio.wait_for(
+            asyncio.gather(*[batcher.query([i]) for i in range(3)], return_exceptions=True),
+            timeout=1
+        )
+
+    results = run_with_batcher(batcher, scenario)
+    assert results[0]["distances"] == [0.0]
+    assert all(isinstance(result, IndexError) for result in results[1:])
+
+
+def test_stop_cancels_in_flight_and_queued_requests():
+    release = threading.Event()
+
+    class BlockingIndex(RecordingIndex):
+        def query(self, query_embeddings, n_results, include):
+            release.wait(timeout=5)
+            return super().query(query_embeddings, n_results, include)
+
+    async def scenario():
+        batcher = QueryBatcher(BlockingIndex(), n_results=1, max_batch_size=1)
+        batcher.start()
+        requests = [asyncio.ensure_future(batcher.query([i])) for i in range(3)]
+        await asyncio.sleep(0.05)  # first request is now inside index.query
+        await batcher.stop()
+        release.set()
+        results = await asyncio.gather(*requests, return_exceptions=True)
+        assert all(isinstance(result, asyncio.CancelledError) for result in results)
+
+    asyncio.run(scenario())
@@ -0,0 +1,64 @@
+import numpy as np
+
+import semantic_cache
+from semantic_cache import SemanticCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def unit(i, dim=8):
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[i] = 1.0
+    return vector
+
+
+def test_hit_above_threshold_and_miss_below():
+    cache = SemanticCache(max_entries=4, threshold=0.95)
+    cache.put(unit(0), "zero")
+
+    near = unit(0) + 0.1 * unit(1)  # cosine ~0.995
+    far = unit(0) + unit(1)         # cosine ~0.707
+    assert cache.get(near) == "zero"
+    assert cache.get(far) is None
+    assert cache.get(unit(2)) is None
+
+
+def test_empty_cache_misses():
+    assert SemanticCache().get(unit(0)) is None
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(semantic_cache.time, "monotonic", clock)
+    cache = SemanticCache(max_entries=4, ttl_seconds=60)
+    cache.put(unit(0), "zero")
+
+    clock.now += 59
+    assert cache.get(unit(0)) == "zero"
+    clock.now += 2
+    assert cache.get(unit(0)) is None
+
+
+def test_full_cache_evicts_least_recently_used(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(semantic_cache.time, "monotonic", clock)
+    cache = SemanticCache(max_entries=3)
+    for i in range(3):
+        clock.now += 1
+        cache.put(unit(i), i)
+
+    # Touch the oldest entry, so entry 1 becomes the least recently used
+    clock.now += 1
+    assert cache.get(unit(0)) == 0
+
+    clock.now += 1
+    cache.put(unit(3), 3)
+    assert len(cache) == 3
+    assert cache.get(unit(1)) is None
+    assert [cache.get(unit(i)) for i in (0, 2, 3)] == [0, 2, 3]
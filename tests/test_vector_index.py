@@ -0,0 +1,67 @@
+import uuid
+
+import chromadb
+import numpy as np
+import pytest
+
+from vector_index import InMemoryIndex
+
+
+def make_collection(configuration=None, metadata=None, n_docs=60, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    collection = chromadb.EphemeralClient().create_collection(
+        f"test-{uuid.uuid4().hex}",
+        configuration=configuration,
+        metadata=metadata,
+        embedding_function=None
+    )
+    collection.add(
+        ids=[f"doc-{i}" for i in range(n_docs)],
+        embeddings=rng.normal(size=(n_docs, dim)).tolist(),
+        metadatas=[{"url": f"https://example.com/{i}"} for i in range(n_docs)]
+    )
+    return collection
+
+
+@pytest.mark.parametrize("space", ["l2", "cosine", "ip"])
+def test_query_matches_collection_query(space):
+    collection = make_collection(configuration={"hnsw": {"space": space}})
+    index = InMemoryIndex.from_collection(collection)
+    assert index.space == space
+    assert len(index) == 60
+
+    queries = np.random.default_rng(1).normal(size=(5, 16)).tolist()
+    expected = collection.query(query_embeddings=queries, n_results=10, include=["metadatas", "distances"])
+    actual = index.query(queries, n_results=10)
+
+    assert actual["ids"] == expected["ids"]
+    assert actual["metadatas"] == expected["metadatas"]
+    np.testing.assert_allclose(actual["distances"], expected["distances"], rtol=1e-4, atol=1e-4)
+
+
+def test_from_collection_reads_space_from_metadata():
+    collection = make_collection(metadata={"hnsw:space": "cosine"})
+    assert InMemoryIndex.from_collection(collection).space == "cosine"
+
+
+def test_collection_space_falls_back_to_metadata_then_l2():
+    class LegacyCollection:
+        configuration = None
+
+        def __init__(self, metadata):
+            self.metadata = metadata
+
+    assert InMemoryIndex._collection_space(LegacyCollection({"hnsw:space": "ip"})) == "ip"
+    assert InMemoryIndex._collection_space(LegacyCollection(None)) == "l2"
+
+
+def test_n_results_larger_than_corpus():
+    index = InMemoryIndex(["a", "b"], [[0.0, 0.0], [1.0, 0.0]], [{"url": "a"}, {"url": "b"}])
+    result = index.query([[0.9, 0.0]], n_results=10)
+    assert result["ids"] == [["b", "a"]]
+    np.testing.assert_allclose(result["distances"], [[0.01, 0.81]], rtol=1e-5)
+
+
+def test_rejects_unknown_space():
+    with pytest.raises(ValueError):
+        InMemoryIndex([], np.zeros((0, 2)), [], space="hamming")
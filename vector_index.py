@@ -0,0 +1,170 @@
+import asyncio
+import contextlib
+import functools
+import numpy as np
+
+
+class InMemoryIndex:
+    """
+    Exact nearest-neighbour search over a whole Chroma collection held in RAM.
+
+    The assessment corpus is small and fixed, so scoring every document with
+    one matrix product is both faster than a round trip through Chroma's
+    query pipeline and exact. `query` mirrors `Collection.query`'s arguments
+    and result shape (including its distance functions), so either can back
+    the endpoints.
+    """
+
+    def __init__(self, ids: list[str], embeddings, metadatas: list[dict], space: str = "l2"):
+        if space not in ("l2", "cosine", "ip"):
+            raise ValueError(f"Unsupported distance space: {space}")
+
+        self.ids = list(ids)
+        self.metadatas = list(metadatas)
+        self.space = space
+
+        self._embeddings = np.asarray(embeddings, dtype=np.float32)
+        if space == "cosine":
+            self._embeddings = self._normalize(self._embeddings)
+        self._squared_norms = np.einsum("ij,ij->i", self._embeddings, self._embeddings)
+
+    @classmethod
+    def from_collection(cls, collection) -> "InMemoryIndex":
+        """Load every embedding and metadata entry from a Chroma collection"""
+        data = collection.get(include=["embeddings", "metadatas"])
+        return cls(data["ids"], data["embeddings"], data["metadatas"], space=cls._collection_space(collection))
+
+    @staticmethod
+    def _collection_space(collection) -> str:
+        # Chroma 1.x keeps the space in the collection configuration (e.g.
+        # {"hnsw": {"space": "cosine", ...}}); older stores only have the
+        # "hnsw:space" metadata key, and both default to l2
+        configuration = getattr(collection, "configuration", None)
+        if isinstance(configuration, dict):
+            for index_type in ("hnsw", "spann"):
+                space = (configuration.get(index_type) or {}).get("space")
+                if space:
+                    return space
+        return (collection.metadata or {}).get("hnsw:space", "l2")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _distances(self, queries: np.ndarray) -> np.ndarray:
+        # Same definitions as Chroma/hnswlib: squared L2, 1 - cos, 1 - dot
+        if self.space == "cosine":
+            return 1.0 - self._normalize(queries) @ self._embeddings.T
+        dots = queries @ self._embeddings.T
+        if self.space == "ip":
+            return 1.0 - dots
+        query_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+        return np.maximum(query_norms + self._squared_norms - 2.0 * dots, 0.0)
+
+    def query(self, query_embeddings, n_results: int = 10, include=None) -> dict:
+        """Return the n_results nearest documents per query, like Collection.query"""
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        distances = self._distances(queries)
+        k = min(n_results, len(self.ids))
+
+        result = {"ids": [], "metadatas": [], "distances": []}
+        for row in distances:
+            top = np.argpartition(row, k - 1)[:k] if k < len(row) else np.arange(len(row))
+            top = top[np.argsort(row[top], kind="stable")]
+            result["ids"].append([self.ids[i] for i in top])
+            result["metadatas"].append([self.metadatas[i] for i in top])
+            result["distances"].append(row[top].tolist())
+        return result
+
+
+class QueryBatcher:
+    """
+    Coalesces concurrent single-vector searches into one multi-vector query.
+
+    Requests queue their vector and await a future; a background task takes
+    the first pending vector, collects whatever else arrives within
+    `window_seconds` (up to `max_batch_size`), runs a single `index.query`
+    on the default thread pool and resolves each future with its own slice.
+    Vectors that queue up while a batch is running go out together in the
+    next one, so under load batches grow without any extra waiting. Any
+    error while serving a batch is set on that batch's futures, so the task
+    keeps running and no caller is left waiting.
+    """
+
+    def __init__(self, index, n_results: int = 10, max_batch_size: int = 32, window_seconds: float = 0.0):
+        self.index = index
+        self.n_results = n_results
+        self.max_batch_size = max_batch_size
+        self.window_seconds = window_seconds
+        self._queue = None
+        self._task = None
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        # Nothing serves the queue any more, so release whoever is still waiting
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+
+    async def query(self, vector) -> dict:
+        """Search for one vector; returns {"metadatas": [...], "distances": [...]}"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((vector, future))
+        return await future
+
+    async def _collect_batch(self, batch: list) -> None:
+        batch.append(await self._queue.get())
+        deadline = asyncio.get_running_loop().time() + self.window_seconds
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = []
+            try:
+                await self._collect_batch(batch)
+                search = functools.partial(
+                    self.index.query,
+                    query_embeddings=[vector for vector, _ in batch],
+                    n_results=self.n_results,
+                    include=["metadatas", "distances"]
+                )
+                results = await loop.run_in_executor(None, search)
+
+                for i, (_, future) in enumerate(batch):
+                    if not future.done():
+                        future.set_result({
+                            "metadatas": results["metadatas"][i],
+                            "distances": results["distances"][i]
+                        })
+            except asyncio.CancelledError:
+                for _, future in batch:
+                    future.cancel()
+                raise
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)